@@ -2,12 +2,19 @@ import streamlit as st
 from streamlit_monaco import st_monaco
 import openai
 from streamlit_audio_recorder import audio_recorder
-import tempfile
 import speech_recognition as sr
 from gtts import gTTS
 import os
 import base64
+import hashlib
+import io
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from state_backend import get_backend
+from languages import LANGUAGES, detect_language, chunk_code, prescan
 
 # Load environment variables
 load_dotenv()
@@ -24,6 +31,58 @@ st.set_page_config(
     experimental_capture_streamlit_audio=True  # Fix for audio recording
 )
 
+# Shared state backend (Redis or SQLite), one connection per app process
+RESPONSE_CACHE_TTL = 3600
+AUDIO_CACHE_TTL = 86400
+RATE_LIMIT_PER_MINUTE = int(os.getenv("RATE_LIMIT_PER_MINUTE", "0"))  # Per client, 0 disables it
+# Number of trusted proxies in front of the app. The client address is the
+# X-Forwarded-For entry this many hops from the right, i.e. the one added by
+# the outermost trusted proxy. The per-client limit only holds behind proxies
+# that append to (or overwrite) this header; with 0 the header is ignored and
+# the limit is per session, which a page reload resets.
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+
+@st.cache_resource
+def shared_backend():
+    return get_backend()
+
+backend = shared_backend()
+
+# Backend errors (Redis down, SQLite locked) fall back to the uncached path
+def cache_get(key):
+    try:
+        return backend.get(key)
+    except Exception:
+        return None
+
+def cache_set(key, value, ttl):
+    try:
+        backend.set(key, value, ttl=ttl)
+    except Exception:
+        pass
+
+# Rate-limit key: the client address from the trusted proxy, else the session
+def client_id():
+    if TRUSTED_PROXY_HOPS:
+        headers = getattr(st, "context", None) and st.context.headers
+        forwarded = headers.get("X-Forwarded-For", "") if headers else ""
+        # Entries left of the trusted ones are set by the client and can be spoofed
+        addresses = [a.strip() for a in forwarded.split(",") if a.strip()]
+        if len(addresses) >= TRUSTED_PROXY_HOPS:
+            return addresses[-TRUSTED_PROXY_HOPS]
+    if "client_id" not in st.session_state:
+        st.session_state.client_id = uuid.uuid4().hex
+    return st.session_state.client_id
+
+def rate_limited(client):
+    if not RATE_LIMIT_PER_MINUTE:
+        return False
+    try:
+        calls = backend.incr(f"ratelimit:{client}:{int(time.time() // 60)}", ttl=120)
+    except Exception:
+        return False
+    return calls > RATE_LIMIT_PER_MINUTE
+
 # Custom CSS for SeekDroid styling
 def local_css(file_name):
     with open(file_name) as f:
@@ -43,6 +102,158 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
+# Conversation settings
+# The system prompt is kept byte-for-byte identical across turns so that the
+# provider's prompt-prefix caching can reuse it.
+SYSTEM_PROMPT = "You are an expert programming assistant and security analyst. Provide detailed explanations with security best practices."
+HISTORY_TOKEN_BUDGET = 6000  # Summarize above this; fits a full code exchange plus follow-ups
+HISTORY_TOKEN_TARGET = 3000  # Roll older turns until the verbatim history is back under this
+
+# Summaries run in the background so they don't hold up the answer, TTS or rerun
+@st.cache_resource
+def summary_executor():
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="summary")
+
+# Chat completion shared by analysis and summaries, counted against the rate limit
+def chat_completion(messages, client, temperature, max_tokens):
+    if rate_limited(client):
+        raise RuntimeError("Rate limit reached, please try again in a minute.")
+    return openai.ChatCompletion.create(
+        model="gpt-4o",
+        messages=messages,
+        temperature=temperature,
+        max_tokens=max_tokens,
+    )
+
+# Rough token estimate (~4 characters per token), avoids a tokenizer dependency
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+def history_tokens(turns):
+    return sum(estimate_tokens(t["content"]) for t in turns)
+
+# Conversation state stored in the Streamlit session
+def get_conversation():
+    if "conversation" not in st.session_state:
+        st.session_state.conversation = {
+            "summary": "",      # Rolled-up summary of older turns
+            "turns": [],        # Recent messages kept verbatim
+            "code_hash": None,  # Hash of the code last sent to the model
+            "pending": None,    # Summary running in the background
+        }
+    return st.session_state.conversation
+
+# Build the message list: stable system prefix, summary, recent turns, new prompt
+def build_messages(conversation, prompt):
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+    if conversation["summary"]:
+        messages.append({
+            "role": "system",
+            "content": f"Summary of the earlier conversation:\n{conversation['summary']}",
+        })
+    messages.extend({"role": t["role"], "content": t["content"]} for t in conversation["turns"])
+    messages.append({"role": "user", "content": prompt})
+    return messages
+
+# Summarize older turns, falling back to a truncated transcript on API errors
+def summarize_turns(previous_summary, turns, client):
+    transcript = "\n\n".join(f"{t['role'].upper()}: {t['content']}" for t in turns)
+    try:
+        response = chat_completion(
+            [
+                {"role": "system", "content": "Summarize this programming and security conversation in under 200 words. Keep file names, languages, vulnerabilities found, and decisions made."},
+                {"role": "user", "content": f"Existing summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}"},
+            ],
+            client,
+            temperature=0,
+            max_tokens=300,
+        )
+        return response.choices[0].message.content
+    except Exception:
+        clipped = "\n".join(f"{t['role']}: {t['content'][:200]}" for t in turns)
+        return f"{previous_summary}\n{clipped}".strip()[-(HISTORY_TOKEN_BUDGET * 2):]
+
+# Keep the verbatim history within HISTORY_TOKEN_BUDGET: apply a finished
+# background summary, or start one once the history is over budget
+def compact_history(conversation, client):
+    pending = conversation["pending"]
+    if pending:
+        if not pending["future"].done():
+            return
+        split = pending["split"]
+        rolled = conversation["turns"][:split]
+        conversation["summary"] = pending["future"].result()
+        conversation["turns"] = conversation["turns"][split:]
+        conversation["pending"] = None
+        # The code was rolled into the summary, so send it again next turn
+        if any(t.get("code") for t in rolled):
+            conversation["code_hash"] = None
+    turns = conversation["turns"]
+    if history_tokens(turns) <= HISTORY_TOKEN_BUDGET:
+        return
+    # Keep the newest exchanges that fit HISTORY_TOKEN_TARGET, at least the last one
+    keep = 2
+    while keep + 2 <= len(turns) and history_tokens(turns[-(keep + 2):]) <= HISTORY_TOKEN_TARGET:
+        keep += 2
+    split = len(turns) - keep
+    if split <= 0:
+        return
+    future = summary_executor().submit(summarize_turns, conversation["summary"], turns[:split], client)
+    conversation["pending"] = {"future": future, "split": split}
+
+# Code context settings
+MAX_CODE_CHARS = 12000  # Longer code is sent as an outline plus selected chunks
+CHUNK_CHARS = 4000
+MAX_OUTLINE_LINES = 40  # Outline entries sent for long code
+MAX_FINDING_LINES = 10  # Line numbers listed per pre-scan message
+
+# Build the code part of the prompt with the local language parser and pre-scan
+def build_code_prompt(code, language):
+    settings = LANGUAGES[language]
+    findings = prescan(code, language)
+    prompt = f"Here is {settings['label']} code"
+    if len(code) <= MAX_CODE_CHARS:
+        prompt += f":\n{code}\n\n"
+    else:
+        chunks = chunk_code(code, language, max_chars=CHUNK_CHARS)
+        flagged = {line for line, _ in findings}
+        # Chunks with pre-scan findings first, then the rest in order, within MAX_CODE_CHARS
+        ordered = sorted(chunks, key=lambda c: not any(c["start"] <= line <= c["end"] for line in flagged))
+        selected = []
+        size = 0
+        for chunk in ordered:
+            if size + len(chunk["code"]) > MAX_CODE_CHARS:
+                continue
+            selected.append(chunk)
+            size += len(chunk["code"])
+        if not selected:
+            # A single overlong line can exceed the budget on its own
+            selected = [dict(ordered[0], code=ordered[0]["code"][:MAX_CODE_CHARS])]
+        selected.sort(key=lambda c: c["start"])
+        outline = "\n".join(
+            f"- lines {c['start']}-{c['end']}: {', '.join(c['names'][:8]) or 'top-level statements'}"
+            for c in chunks[:MAX_OUTLINE_LINES]
+        )
+        if len(chunks) > MAX_OUTLINE_LINES:
+            outline += f"\n- …and {len(chunks) - MAX_OUTLINE_LINES} more sections"
+        prompt += f" ({len(code.splitlines())} lines). Outline:\n{outline}\n\nSelected sections:\n"
+        prompt += "\n\n".join(f"Lines {c['start']}-{c['end']}:\n{c['code']}" for c in selected)
+        prompt += "\n\n"
+    if findings:
+        # One entry per message with a bounded list of lines, so repeated hits stay small
+        by_message = {}
+        for line, message in findings:
+            by_message.setdefault(message, []).append(line)
+        prompt += "Local pre-scan flagged:\n"
+        for message, lines in by_message.items():
+            listed = ", ".join(str(line) for line in lines[:MAX_FINDING_LINES])
+            if len(lines) > MAX_FINDING_LINES:
+                listed += f" …and {len(lines) - MAX_FINDING_LINES} more"
+            prompt += f"- {message} (line{'s' if len(lines) > 1 else ''} {listed})\n"
+        prompt += "\n"
+    prompt += f"Security analysis: Please identify any vulnerabilities, suggest improvements, and add security best practices. Pay particular attention to {settings['focus']}.\n\n"
+    return prompt
+
 # Main tabs for different features
 tab1, tab2 = st.tabs(["🔒 Security Coding Assistant", "✨ Lyra Prompt Optimizer"])
 
@@ -127,6 +338,18 @@ with tab1:
             </div>
         """, unsafe_allow_html=True)
         
+        # Editor language: user choice, or the language detected from the editor content
+        language_choice = st.selectbox(
+            "Language",
+            ["Auto-detect"] + list(LANGUAGES),
+            format_func=lambda name: LANGUAGES[name]["label"] if name in LANGUAGES else name,
+            key="code_language",
+        )
+        if language_choice == "Auto-detect":
+            language = st.session_state.get("detected_language", "python")
+        else:
+            language = language_choice
+        
         code = st_monaco(
             value='''# Write a Python function to check if a number is prime
 def is_prime(n):
@@ -136,24 +359,35 @@ def is_prime(n):
         if n % i == 0:
             return False
     return True''',
-            language='python',
+            language=LANGUAGES[language]["monaco"],
             height=300,
             key="code_editor"
         )
         
+        if language_choice == "Auto-detect":
+            detected = detect_language(code)
+            if detected != language:
+                # Rerun so the editor is rendered with the newly detected language
+                st.session_state.detected_language = detected
+                st.rerun()
+            st.caption(f"Detected language: {LANGUAGES[language]['label']}")
+        
         text_override = st.text_area("Or type your question here (overrides voice input):", height=100)
         
         # Speech recognition function
         def speech_to_text(audio_bytes):
             recognizer = sr.Recognizer()
             if audio_bytes:
+                # Transcripts are shared so any worker can serve a rerun
+                cache_key = "stt:" + hashlib.sha256(audio_bytes).hexdigest()
+                cached = cache_get(cache_key)
+                if cached is not None:
+                    return cached.decode("utf-8")
                 try:
-                    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_file:
-                        tmp_file.write(audio_bytes)
-                        tmp_file.flush()
-                        with sr.AudioFile(tmp_file.name) as source:
-                            audio = recognizer.record(source)
+                    with sr.AudioFile(io.BytesIO(audio_bytes)) as source:
+                        audio = recognizer.record(source)
                     text = recognizer.recognize_google(audio)
+                    cache_set(cache_key, text.encode("utf-8"), ttl=AUDIO_CACHE_TTL)
                     return text
                 except Exception as e:
                     return f"[Speech recognition error: {e}]"
@@ -162,11 +396,17 @@ def is_prime(n):
         # Text to speech function
         def text_to_speech(text):
             if text:
+                cache_key = "tts:" + hashlib.sha256(text.encode("utf-8")).hexdigest()
+                cached = cache_get(cache_key)
+                if cached is not None:
+                    return cached
                 tts = gTTS(text=text, lang='en')
-                tmp_audio = tempfile.NamedTemporaryFile(suffix=".mp3", delete=False)
-                tts.save(tmp_audio.name)
-                return tmp_audio.name
-            return ""
+                buffer = io.BytesIO()
+                tts.write_to_fp(buffer)
+                audio = buffer.getvalue()
+                cache_set(cache_key, audio, ttl=AUDIO_CACHE_TTL)
+                return audio
+            return b""
         
         if text_override.strip():
             user_query = text_override.strip()
@@ -178,28 +418,70 @@ def is_prime(n):
             user_query = ""
         
         # OpenAI query function
-        def ask_openai(prompt):
+        def ask_openai(messages, client):
+            start_time = time.perf_counter()
+            cache_key = "response:" + hashlib.sha256(json.dumps(messages).encode("utf-8")).hexdigest()
+            cached = cache_get(cache_key)
+            if cached is not None:
+                stats = {
+                    "prompt_tokens": 0,
+                    "completion_tokens": 0,
+                    "latency": time.perf_counter() - start_time,
+                    "cached": True,
+                }
+                return cached.decode("utf-8"), stats
             try:
-                response = openai.ChatCompletion.create(
-                    model="gpt-4o",
-                    messages=[
-                        {"role": "system", "content": "You are an expert programming assistant and security analyst. Provide detailed explanations with security best practices."},
-                        {"role": "user", "content": prompt},
-                    ],
-                    temperature=0.3,
-                    max_tokens=800,
-                )
-                return response.choices[0].message.content
+                response = chat_completion(messages, client, temperature=0.3, max_tokens=800)
+                stats = {
+                    "prompt_tokens": response.usage.prompt_tokens,
+                    "completion_tokens": response.usage.completion_tokens,
+                    "latency": time.perf_counter() - start_time,
+                    "cached": False,
+                }
+                content = response.choices[0].message.content
+                cache_set(cache_key, content.encode("utf-8"), ttl=RESPONSE_CACHE_TTL)
+                return content, stats
             except Exception as e:
-                return f"⚠️ API Error: {str(e)}"
+                return f"⚠️ API Error: {str(e)}", None
+        
+        conversation = get_conversation()
+        client = client_id()
+        
+        # Show earlier turns of the conversation
+        if conversation["summary"]:
+            with st.expander("Earlier conversation (summarized)"):
+                st.markdown(conversation["summary"])
+        for turn in conversation["turns"]:
+            with st.chat_message(turn["role"]):
+                if turn["role"] == "assistant":
+                    st.markdown(turn["content"])
+                    continue
+                # User turns show what was asked, not the generated prompt
+                if turn.get("question"):
+                    st.markdown(turn["question"])
+                if turn.get("code"):
+                    st.code(turn["code"], language=LANGUAGES[turn["language"]]["monaco"])
+                elif turn.get("language"):
+                    st.caption("Same code as the previous turn")
         
         if st.button("Get AI Analysis", use_container_width=True, type="primary"):
             if not user_query and not code.strip():
                 st.warning("Please provide a voice input, typed question, or code snippet.")
             else:
+                # Apply a summary finished since the last turn first: it may have
+                # rolled the code out of the history, which decides whether to resend it
+                compact_history(conversation, client)
                 prompt = ""
+                code_sent = False
                 if code.strip():
-                    prompt += f"Here is Python code:\n{code}\n\nSecurity analysis: Please identify any vulnerabilities, suggest improvements, and add security best practices.\n\n"
+                    # The language is part of the hash: switching it changes the prompt
+                    code_hash = hashlib.sha256(f"{language}\n{code}".encode("utf-8")).hexdigest()
+                    if code_hash == conversation["code_hash"]:
+                        # Code already in the history, don't resend it
+                        prompt += "The code is unchanged from earlier in this conversation.\n\n"
+                    else:
+                        prompt += build_code_prompt(code, language)
+                        code_sent = True
                 if user_query:
                     prompt += f"User question: {user_query}\n\n"
                 
@@ -209,22 +491,41 @@ def is_prime(n):
                 )
                 
                 with st.spinner("Analyzing code with AI security protocols..."):
-                    ai_response = ask_openai(prompt)
+                    ai_response, stats = ask_openai(build_messages(conversation, prompt), client)
                 
                 st.subheader("AI Security Analysis")
                 st.markdown(ai_response)
         
+                if stats:
+                    st.caption(
+                        f"Prompt tokens: {stats['prompt_tokens']} · "
+                        f"Completion tokens: {stats['completion_tokens']} · "
+                        f"Latency: {stats['latency']:.2f}s"
+                        + (" · Cached" if stats["cached"] else "")
+                    )
+                    conversation["turns"].append({
+                        "role": "user",
+                        "content": prompt,
+                        "question": user_query,
+                        "code": code if code_sent else None,
+                        "language": language if code.strip() else None,
+                    })
+                    conversation["turns"].append({"role": "assistant", "content": ai_response})
+                    if code_sent:
+                        conversation["code_hash"] = code_hash
+                    compact_history(conversation, client)
+        
                 if ai_response and not ai_response.startswith("⚠️"):
                     with st.spinner("Generating voice summary..."):
-                        audio_file = text_to_speech(ai_response[:500])  # Limit to first 500 chars
+                        audio_data = text_to_speech(ai_response[:500])  # Limit to first 500 chars
                     
-                    if audio_file:
-                        st.audio(audio_file, format="audio/mp3")
-                        # Cleanup temporary audio file
-                        try:
-                            os.remove(audio_file)
-                        except Exception:
-                            pass
+                    if audio_data:
+                        st.audio(audio_data, format="audio/mp3")
+        
+        if conversation["turns"] or conversation["summary"]:
+            if st.button("Clear Conversation", use_container_width=True):
+                del st.session_state.conversation
+                st.rerun()
         
         st.markdown("</div>", unsafe_allow_html=True)
 
@@ -0,0 +1,117 @@
+"""Contention benchmark for multiple worker processes sharing one state backend.
+
+Each worker is a separate process that handles simulated requests: a
+rate-limit increment, a response-cache lookup (with a write on a miss) and,
+optionally, some CPU work standing in for the Streamlit script run. Backend
+ops/s and mean op latency are reported next to requests/s, showing how much
+the shared backend slows down as workers are added.
+
+    python benchmark_workers.py --backend sqlite:///bench_state.db
+    python benchmark_workers.py --backend redis://localhost:6379/0 --cpu-work 5
+
+This measures the backend layer only, not Streamlit behind a load balancer,
+and makes no claim about end-to-end scaling. SQLite serializes all writes,
+so its numbers flatten out as workers are added.
+"""
+import argparse
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import time
+
+from state_backend import get_backend
+
+PAYLOAD = os.urandom(4 * 1024)
+
+
+# Returns (backend ops, seconds spent in the backend)
+def handle_request(backend, worker_id, i, cache_keys, cpu_work):
+    start = time.perf_counter()
+    backend.incr(f"ratelimit:{worker_id}:{int(time.time() // 60)}", ttl=120)
+    key = f"response:{i % cache_keys}"
+    ops = 2
+    if backend.get(key) is None:
+        backend.set(key, b"x" * 2048, ttl=3600)
+        ops += 1
+    backend_time = time.perf_counter() - start
+    # Simulated script run
+    digest = PAYLOAD
+    for _ in range(cpu_work):
+        digest = hashlib.sha256(digest + PAYLOAD).digest()
+    return ops, backend_time
+
+
+def worker(url, worker_id, duration, cache_keys, cpu_work, start_event, results):
+    backend = get_backend(url)
+    start_event.wait()
+    deadline = time.perf_counter() + duration
+    requests = ops = 0
+    backend_time = 0.0
+    while time.perf_counter() < deadline:
+        request_ops, request_time = handle_request(backend, worker_id, requests, cache_keys, cpu_work)
+        requests += 1
+        ops += request_ops
+        backend_time += request_time
+    results.put((requests, ops, backend_time))
+
+
+def run(url, workers, duration, cache_keys, cpu_work):
+    start_event = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    procs = [
+        multiprocessing.Process(target=worker, args=(url, n, duration, cache_keys, cpu_work, start_event, results))
+        for n in range(workers)
+    ]
+    for p in procs:
+        p.start()
+    time.sleep(0.5)  # Let every worker open its connection first
+    start_event.set()
+    totals = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    requests = sum(t[0] for t in totals)
+    ops = sum(t[1] for t in totals)
+    backend_time = sum(t[2] for t in totals)
+    return requests / duration, ops / duration, backend_time / ops * 1e6
+
+
+def benchmark(args, url):
+    get_backend(url)  # Create tables before the workers start
+
+    counts = []
+    n = 1
+    while n <= args.max_workers:
+        counts.append(n)
+        n *= 2
+    if counts[-1] != args.max_workers:
+        counts.append(args.max_workers)
+
+    print(f"Backend: {url}  CPU work per request: {args.cpu_work}  Cores: {os.cpu_count()}")
+    print(f"{'workers':>8} {'req/s':>10} {'ops/s':>10} {'op µs':>8} {'speedup':>8} {'efficiency':>10}")
+    baseline = None
+    for workers in counts:
+        throughput, ops, op_latency = run(url, workers, args.duration, args.cache_keys, args.cpu_work)
+        baseline = baseline or throughput
+        speedup = throughput / baseline
+        print(f"{workers:>8} {throughput:>10.1f} {ops:>10.1f} {op_latency:>8.1f} {speedup:>8.2f} {speedup / workers:>10.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", default=None, help="STATE_BACKEND_URL to benchmark (default: temporary SQLite file)")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds per run")
+    parser.add_argument("--cache-keys", type=int, default=100, help="Distinct response cache keys")
+    parser.add_argument("--cpu-work", type=int, default=0, help="SHA-256 passes over 4 KB per request (simulated script run)")
+    args = parser.parse_args()
+
+    if args.backend:
+        benchmark(args, args.backend)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            benchmark(args, "sqlite:///" + os.path.join(tmp, "bench_state.db"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""Local language detection and lightweight parsers for SeekDroid AI.
+
+Everything here runs locally with regular expressions, so the editor
+language, the prompt wording, structure-aware chunking and the security
+pre-scan are settled before any model call.
+"""
+import re
+
+# Per-language settings: display label, Monaco language id, block style used
+# by the parser, detection signatures (pattern, weight) and pre-scan rules.
+LANGUAGES = {
+    "python": {
+        "label": "Python",
+        "monaco": "python",
+        "blocks": "indent",
+        "definition": re.compile(r"^(?:async\s+def|def|class)\s+(\w+)"),
+        "focus": "injection via eval/exec or shell commands, unsafe deserialization, path traversal and secret handling",
+        "signatures": [
+            (r"^\s*def \w+\(.*\)\s*(->\s*[\w\[\], .]+)?:\s*$", 3),
+            (r"^\s*(import \w+|from [\w.]+ import )", 3),
+            (r"^\s*(elif|except|finally)\b.*:\s*$", 2),
+            (r"\bself\.\w+", 2),
+            (r"\b(None|True|False)\b", 1),
+            (r"^\s*#(?!\s*(include|import|property|define|undef|if|ifdef|ifndef|else|elif|endif|pragma|error|warning|line)\b)", 1),
+        ],
+        "prescan": [
+            (r"\b(eval|exec)\s*\(", "eval/exec on dynamic input allows code injection"),
+            (r"\bpickle\.loads?\s*\(", "pickle can execute code when loading untrusted data"),
+            (r"\byaml\.load\s*\((?![^)]*SafeLoader)", "yaml.load without SafeLoader can construct arbitrary objects"),
+            (r"shell\s*=\s*True", "subprocess with shell=True is open to command injection"),
+            (r"\bos\.(system|popen)\s*\(", "os.system/os.popen runs commands through the shell"),
+            (r"verify\s*=\s*False", "TLS certificate verification disabled"),
+            (r"\bhashlib\.(md5|sha1)\s*\(", "MD5/SHA1 are too weak for security purposes"),
+        ],
+    },
+    "cpp": {
+        "label": "C++",
+        "monaco": "cpp",
+        "blocks": "brace",
+        "definition": re.compile(r"(?:\b(?:class|struct|namespace)\s+(\w+))|(?:(?<![\w~])(?!(?:if|for|while|switch|return|catch|sizeof|alignof|decltype|static_assert|throw|new|delete|defined)\b)(~?\w+(?:::~?\w+)*)\s*\([^;]*\)\s*(?:const\s*)?(?:override\s*)?(?:\{.*)?$)"),
+        "focus": "buffer overflows, memory management (leaks, use-after-free, double free), integer overflow and unchecked input",
+        "signatures": [
+            (r"^\s*#include\s*[<\"]", 3),
+            (r"^\s*#\s*(define|undef|ifdef|ifndef|endif|pragma)\b", 2),
+            (r"\bstd::", 3),
+            (r"\bint\s+main\s*\(", 3),
+            (r"\b(template\s*<|nullptr|public:|private:|protected:)", 2),
+            (r"\b(cout|cin|endl)\b", 2),
+            (r"\b(delete|new)\s+\w+", 1),
+            (r"->\w+", 1),
+        ],
+        "prescan": [
+            (r"\bgets\s*\(", "gets has no bounds check"),
+            (r"\b(strcpy|strcat|sprintf|vsprintf)\s*\(", "unbounded string copy can overflow the buffer"),
+            (r"\bscanf\s*\(\s*\"[^\"]*%s", "scanf %s without a width can overflow the buffer"),
+            (r"\bsystem\s*\(", "system() runs commands through the shell"),
+            (r"\b(malloc|free)\s*\(", "manual malloc/free, check for leaks and double free"),
+            (r"\brand\s*\(", "rand() is not suitable for security-sensitive randomness"),
+        ],
+    },
+    "mql5": {
+        "label": "MQL5",
+        "monaco": "cpp",  # Monaco has no MQL5 mode, C++ is the closest
+        "blocks": "brace",
+        "definition": re.compile(r"(?:\b(?:class|struct)\s+(\w+))|(?:\b(?!(?:if|for|while|switch|return|sizeof|delete|new|defined)\b)(\w+)\s*\([^;]*\)\s*(?:const\s*)?(?:\{.*)?$)"),
+        "focus": "order handling and trade result checks, risk and lot-size validation, DLL imports and WebRequest usage",
+        "signatures": [
+            (r"\b(OnTick|OnInit|OnDeinit|OnCalculate|OnTrade)\s*\(", 4),
+            (r"^\s*#property\b", 3),
+            (r"\b(OrderSend|CTrade|PositionSelect|SymbolInfoDouble|iMA|CopyBuffer)\b", 3),
+            (r"^\s*input\s+\w+\s+\w+", 2),
+            (r"\b(_Symbol|_Period|_Point|Symbol\(\))", 2),
+            (r"#include\s*<Trade/", 3),
+        ],
+        "prescan": [
+            (r"^\s*#import\s+\"[^\"]+\.dll\"", "DLL import runs native code outside the MQL5 sandbox"),
+            (r"\bWebRequest\s*\(", "WebRequest sends data to an external server"),
+            (r"\bOrderSend\s*\(", "check the OrderSend result and retcode before continuing"),
+            (r"\b(FileOpen|FileWrite)\s*\(", "file access, validate paths and contents"),
+        ],
+    },
+    "pine": {
+        "label": "Pine Script",
+        "monaco": "javascript",  # Monaco has no Pine mode, JavaScript covers its comments and strings
+        "blocks": "indent",
+        "definition": re.compile(r"^(\w+)\s*\([^)]*\)\s*=>"),
+        "focus": "repainting and lookahead bias, request.security usage, and strategy order/risk settings",
+        "signatures": [
+            (r"^\s*//@version=\d", 5),
+            (r"\b(indicator|strategy|study)\s*\(", 4),
+            (r"\b(ta|math|request|strategy|input)\.\w+\s*\(", 3),
+            (r"\bplot(shape|char)?\s*\(", 2),
+            (r"\w+\s*:=", 1),
+        ],
+        "prescan": [
+            (r"lookahead\s*=\s*barmerge\.lookahead_on", "lookahead_on leaks future data and repaints"),
+            (r"\b(request\.)?security\s*\(", "request.security can repaint on realtime bars"),
+            (r"calc_on_every_tick\s*=\s*true", "calc_on_every_tick makes strategy results differ from live trading"),
+        ],
+    },
+}
+
+DEFAULT_LANGUAGE = "python"
+
+# Checked for every language
+COMMON_PRESCAN = [
+    (r"(?i)\b(password|passwd|secret|api_?key|token)\s*=\s*[\"'][^\"']+[\"']", "hardcoded credential"),
+]
+
+for _settings in LANGUAGES.values():
+    _settings["signatures"] = [(re.compile(p, re.MULTILINE), w) for p, w in _settings["signatures"]]
+    _settings["prescan"] = [(re.compile(p), msg) for p, msg in _settings["prescan"] + COMMON_PRESCAN]
+
+
+# Pick the language with the highest signature score
+def detect_language(code):
+    if not code.strip():
+        return DEFAULT_LANGUAGE
+    scores = {
+        name: sum(w * len(pattern.findall(code)) for pattern, w in settings["signatures"])
+        for name, settings in LANGUAGES.items()
+    }
+    best = max(scores, key=scores.get)
+    return best if scores[best] > 0 else DEFAULT_LANGUAGE
+
+
+# Split code into top-level units: (start_line, end_line, name), 1-based and inclusive
+def parse_units(code, language):
+    settings = LANGUAGES[language]
+    lines = code.splitlines()
+    if settings["blocks"] == "indent":
+        spans = _indent_spans(lines)
+    else:
+        spans = _brace_spans(lines)
+    units = []
+    for start, end in spans:
+        name = None
+        for line in lines[start:end + 1]:
+            match = settings["definition"].search(line.strip())
+            if match:
+                name = next(g for g in match.groups() if g)
+                break
+        units.append((start + 1, end + 1, name))
+    return units
+
+
+def _indent_spans(lines):
+    spans = []
+    start = None
+    decorated = False
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        top_level = (
+            stripped
+            and not line[0].isspace()
+            and not stripped.startswith(("#", "//", ")", "]", "}"))
+            and not re.match(r"(else|elif|except|finally)\b", stripped)
+        )
+        # Decorators start a unit, the definition they decorate continues it
+        if top_level and not decorated:
+            if start is not None:
+                spans.append((start, _last_code_line(lines, start, i - 1)))
+            start = i
+        elif start is None and stripped:
+            start = i
+        if top_level:
+            decorated = stripped.startswith("@")
+    if start is not None:
+        spans.append((start, _last_code_line(lines, start, len(lines) - 1)))
+    return spans
+
+
+def _brace_spans(lines):
+    spans = []
+    start = None
+    depth = 0
+    in_comment = False
+    for i, line in enumerate(lines):
+        # Drop strings and comments before counting braces
+        code_line = re.sub(r"\"(\\.|[^\"\\])*\"|'(\\.|[^'\\])*'", "\"\"", line)
+        if in_comment:
+            if "*/" not in code_line:
+                continue
+            code_line = code_line.split("*/", 1)[1]
+            in_comment = False
+        code_line = re.sub(r"/\*.*?\*/", "", code_line).split("//", 1)[0]
+        if "/*" in code_line:
+            code_line, in_comment = code_line.split("/*", 1)[0], True
+        stripped = code_line.strip()
+        if start is None:
+            if not stripped:
+                continue
+            start = i
+        opened = code_line.count("{")
+        depth += opened - code_line.count("}")
+        if depth <= 0:
+            depth = 0
+            # A unit ends on a closing brace, a statement, or a preprocessor line
+            if "}" in code_line or stripped.endswith(";") or stripped.startswith("#"):
+                spans.append((start, i))
+                start = None
+    if start is not None:
+        spans.append((start, _last_code_line(lines, start, len(lines) - 1)))
+    return spans
+
+
+def _last_code_line(lines, start, end):
+    while end > start and not lines[end].strip():
+        end -= 1
+    return end
+
+
+# Split a unit larger than max_chars into pieces, preferring to break before
+# an inner definition or at a blank line; a single overlong line stays whole
+def _split_unit(lines, start, end, name, max_chars, definition):
+    pieces = []
+    piece_start = start
+    size = 0
+    last_break = None
+    for number in range(start, end + 1):
+        line = lines[number - 1]
+        if size and size + len(line) + 1 > max_chars:
+            cut = last_break if last_break and last_break > piece_start else number
+            pieces.append((piece_start, cut - 1))
+            piece_start = cut
+            size = sum(len(l) + 1 for l in lines[cut - 1:number - 1])
+            last_break = None
+        if not line.strip() or definition.search(line.strip()):
+            last_break = number
+        size += len(line) + 1
+    pieces.append((piece_start, end))
+    units = []
+    for piece_start, piece_end in pieces:
+        inner = None
+        for line in lines[piece_start - 1:piece_end]:
+            match = definition.search(line.strip())
+            if match:
+                inner = next(g for g in match.groups() if g)
+                break
+        units.append((piece_start, piece_end, inner if inner and inner != name else name))
+    return units
+
+
+# Group top-level units into chunks of at most max_chars; units larger than
+# max_chars are split first
+def chunk_code(code, language, max_chars=6000):
+    lines = code.splitlines()
+    definition = LANGUAGES[language]["definition"]
+    units = []
+    for start, end, name in parse_units(code, language):
+        if sum(len(line) + 1 for line in lines[start - 1:end]) > max_chars:
+            units.extend(_split_unit(lines, start, end, name, max_chars, definition))
+        else:
+            units.append((start, end, name))
+    chunks = []
+    current = []
+    size = 0
+    for start, end, name in units:
+        unit_size = sum(len(line) + 1 for line in lines[start - 1:end])
+        if current and size + unit_size > max_chars:
+            chunks.append(current)
+            current, size = [], 0
+        current.append((start, end, name))
+        size += unit_size
+    if current:
+        chunks.append(current)
+    return [
+        {
+            "start": chunk[0][0],
+            "end": chunk[-1][1],
+            "names": [name for _, _, name in chunk if name],
+            "code": "\n".join(lines[chunk[0][0] - 1:chunk[-1][1]]),
+        }
+        for chunk in chunks
+    ]
+
+
+# Flag risky patterns line by line: list of (line_number, message)
+def prescan(code, language):
+    findings = []
+    rules = LANGUAGES[language]["prescan"]
+    for number, line in enumerate(code.splitlines(), start=1):
+        for pattern, message in rules:
+            if pattern.search(line):
+                findings.append((number, message))
+    return findings
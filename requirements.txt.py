@@ -4,4 +4,5 @@ openai
 streamlit-audio-recorder
 SpeechRecognition
 gtts
-python-dotenv
\ No newline at end of file
+python-dotenv
+redis
\ No newline at end of file
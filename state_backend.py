@@ -0,0 +1,118 @@
+"""Shared state backend for SeekDroid AI.
+
+Caches, rate-limit counters and audio blobs go through a backend shared by
+every app process, so several Streamlit workers behind a load balancer
+behave the same way. Select it with STATE_BACKEND_URL:
+
+    redis://localhost:6379/0        Redis (requires the `redis` package)
+    sqlite:///seekdroid_state.db    Local SQLite file (default)
+
+The SQLite backend needs SQLite 3.24+ for upserts (bundled with Python 3.8+).
+"""
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_BACKEND_URL = "sqlite:///seekdroid_state.db"
+PURGE_EVERY = 200  # SQLite writes between purges of expired rows
+
+
+class RedisBackend:
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("The redis package is required for redis:// backends (pip install redis)") from e
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, value, ex=ttl)
+
+    def incr(self, key, ttl=None):
+        pipe = self.client.pipeline()
+        if ttl:
+            # Create the counter with its TTL only if missing, so INCR keeps the expiry
+            pipe.set(key, 0, ex=ttl, nx=True)
+        pipe.incr(key)
+        return pipe.execute()[-1]
+
+
+class SQLiteBackend:
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()  # sqlite3 connections are per thread
+        self.writes = 0
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB, expires REAL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS counters (key TEXT PRIMARY KEY, value INTEGER, expires REAL)")
+        self.purge()
+
+    def _conn(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            # WAL lets readers in other processes proceed while one process writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires IS NULL OR expires > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return row[0] if row else None
+
+    # Delete expired rows, otherwise old counters and blobs stay in the file forever
+    def purge(self):
+        now = time.time()
+        conn = self._conn()
+        conn.execute("DELETE FROM kv WHERE expires <= ?", (now,))
+        conn.execute("DELETE FROM counters WHERE expires <= ?", (now,))
+
+    def _after_write(self):
+        self.writes += 1
+        if self.writes % PURGE_EVERY == 0:
+            self.purge()
+
+    def set(self, key, value, ttl=None):
+        expires = time.time() + ttl if ttl else None
+        self._conn().execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, ?)",
+            (key, value, expires),
+        )
+        self._after_write()
+
+    def incr(self, key, ttl=None):
+        now = time.time()
+        expires = now + ttl if ttl else None
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM counters WHERE key = ? AND expires <= ?", (key, now))
+            conn.execute(
+                "INSERT INTO counters (key, value, expires) VALUES (?, 1, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = value + 1",
+                (key, expires),
+            )
+            value = conn.execute("SELECT value FROM counters WHERE key = ?", (key,)).fetchone()[0]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._after_write()
+        return value
+
+
+def get_backend(url=None):
+    url = url or os.getenv("STATE_BACKEND_URL", DEFAULT_BACKEND_URL)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    if url.startswith("sqlite:///"):
+        return SQLiteBackend(url[len("sqlite:///"):])
+    raise ValueError(f"Unsupported STATE_BACKEND_URL: {url}")
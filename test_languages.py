@@ -0,0 +1,114 @@
+from languages import LANGUAGES, chunk_code, detect_language, parse_units, prescan
+
+PYTHON = '''import os
+
+@decorator
+def f(x):
+    if x:
+        return eval(x)
+    else:
+        return 1
+
+
+class A:
+    def m(self):
+        pass
+'''
+
+CPP = '''#include <iostream>
+#include <cstring>
+
+class List {
+public:
+    ~List() { delete head; }
+};
+
+int g() { return 1; }
+
+int main()
+{
+    char buf[10];
+    strcpy(buf, "{oops");  // }
+    if (buf[0]) {
+        std::cout << buf << std::endl;
+    }
+    return 0;
+}
+'''
+
+MQL5 = '''#property copyright "x"
+#include <Trade/Trade.mqh>
+input int FastEMA = 50;
+int OnInit() { return(INIT_SUCCEEDED); }
+void OnTick()
+  {
+   double ema = iMA(_Symbol, _Period, FastEMA, 0, MODE_EMA, PRICE_CLOSE);
+  }
+'''
+
+PINE = '''//@version=5
+indicator("RSI", overlay=true)
+rsi = ta.rsi(close, 14)
+f(x) =>
+    x * 2
+plot(rsi)
+'''
+
+HEADER = '''#ifndef LIST_H
+#define LIST_H
+#ifdef DEBUG
+#define TRACE 1
+#endif
+int size(int a);
+#endif
+'''
+
+
+def test_detect_language():
+    assert detect_language(PYTHON) == "python"
+    assert detect_language(CPP) == "cpp"
+    assert detect_language(MQL5) == "mql5"
+    assert detect_language(PINE) == "pine"
+    assert detect_language("") == "python"
+
+
+def test_detect_language_preprocessor_header_is_cpp():
+    assert detect_language(HEADER) == "cpp"
+
+
+def test_parse_units_python_keeps_decorator_with_function():
+    assert parse_units(PYTHON, "python") == [(1, 1, None), (3, 8, "f"), (11, 13, "A")]
+
+
+def test_parse_units_cpp_braces_in_strings_and_one_line_bodies():
+    units = parse_units(CPP, "cpp")
+    assert [name for _, _, name in units] == [None, None, "List", "g", "main"]
+    assert units[-1][:2] == (11, 19)
+
+
+def test_parse_units_mql5_one_line_body():
+    names = [name for _, _, name in parse_units(MQL5, "mql5")]
+    assert "OnInit" in names and "OnTick" in names
+
+
+def test_cpp_definition_skips_control_keywords():
+    definition = LANGUAGES["cpp"]["definition"]
+    for line in ["if (x) {", "while (n > 0) {", "switch (x) {", "} else if (a) {", "for (;;) {"]:
+        assert definition.search(line) is None, line
+
+
+def test_chunk_code_covers_all_lines_within_limit():
+    code = "class Big {\npublic:\n" + "\n".join(
+        f"    int m{i}(int x) {{\n" + "        x += 1;\n" * 40 + "        return x;\n    }\n" for i in range(50)
+    ) + "};\n"
+    chunks = chunk_code(code, "cpp", max_chars=4000)
+    assert len(chunks) > 1
+    assert all(len(c["code"]) <= 4000 for c in chunks)
+    assert chunks[0]["start"] == 1
+    assert chunks[-1]["end"] == len(code.splitlines())
+    assert all(a["end"] + 1 == b["start"] for a, b in zip(chunks, chunks[1:]))
+
+
+def test_prescan():
+    assert prescan(PYTHON, "python") == [(6, "eval/exec on dynamic input allows code injection")]
+    assert [line for line, _ in prescan(CPP, "cpp")] == [14]